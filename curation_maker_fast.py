@@ -1,12 +1,122 @@
 import asyncio
+import aiofiles
 import aiohttp
+import ahocorasick
+import json
+import os
 import time
-from typing import List, Dict
-from bs4 import BeautifulSoup
+from typing import List, Dict, Iterable
+from selectolax.lexbor import LexborHTMLParser
 import re
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote, unquote_plus
+
+try:
+    import uvloop  # faster event loop; not available on Windows
+except ImportError:
+    uvloop = None
+
+
+# Product-detail sections: heading/text/div tags whose class mentions one of
+# these words. Matched case-insensitively inside the lexbor CSS engine.
+_SECTION_SELECTOR = (
+    ':is(h1, h2, h3, p, div)'
+    ':is([class*="product" i], [class*="description" i], [class*="detail" i], '
+    '[class*="feature" i], [class*="special" i])'
+)
+
+# Everything _parse_extract_parts needs, fetched with one query
+_PARSE_SELECTOR = 'meta[name], ' + _SECTION_SELECTOR
+
+# Sections whose class/id marks them as recommendations, not this product
+_EXCLUDE_RE = re.compile(r'similar|viewed|recommend|related|carousel', re.IGNORECASE)
+
+_SEARCHTEXT_RE = re.compile(r'[?&](?:q|searchText)=([^&]+)')
+
+_API_TEMPLATE = ('https://searchbff.tatacliq.com/products/lux/search'
+                 '?pageSize=24&page={page}&searchText={q}&isPwa=true&channel=web&isMDE=true')
+
+# Scraped products are streamed here as JSON lines, then re-read for filtering
+PRODUCTS_FILE = "scraped_products.jsonl"
+
+# Product pages use the session's default headers; API calls override Accept
+_PRODUCT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Referer': 'https://luxury.tatacliq.com/'
+}
+_API_HEADERS = {
+    'Accept': '*/*',
+}
+
+# Product pages in flight at once (AIMD start and ceiling), and tasks
+# scheduled per gather() call
+_INITIAL_CONCURRENCY = 15
+_MAX_CONCURRENCY = 20
+_GATHER_CHUNK = 500
+
+# Worker processes for HTML text extraction, so parsing runs on every core
+# while the event loop keeps requests flowing
+_POOL = ProcessPoolExecutor(max_workers=os.cpu_count())
+
+
+class ConcurrencyController:
+    """
+    Adaptive (AIMD) limit on in-flight product requests
+
+    Grows by 0.5 after each fast success, halves on 429/5xx, exhausted rate
+    limits, timeouts or responses slower than target_latency.
+    """
+
+    def __init__(self, initial: int = _INITIAL_CONCURRENCY, maximum: int = _MAX_CONCURRENCY,
+                 target_latency: float = 5.0):
+        self.current = float(initial)
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self._in_flight = 0
+        self._cond = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Wait until the current limit allows one more request"""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < int(self.current))
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def record(self, status: int, elapsed: float):
+        """Feed back the outcome of one request"""
+        if status == 429 or status >= 500 or elapsed > self.target_latency:
+            self.backoff()
+        else:
+            self.current = min(self.maximum, self.current + 0.5)
 
+    def backoff(self):
+        """Halve the limit (never below one request)"""
+        self.current = max(1.0, self.current * 0.5)
 
-async def scrape_all_products_async(url: str, debug: bool = False):
+
+def create_session() -> aiohttp.ClientSession:
+    """
+    Create the keep-alive session shared by API pagination and product scraping
+    """
+    connector = aiohttp.TCPConnector(limit=_MAX_CONCURRENCY, limit_per_host=_MAX_CONCURRENCY, force_close=False,
+                                     ttl_dns_cache=300, keepalive_timeout=30,
+                                     enable_cleanup_closed=True,
+                                     resolver=aiohttp.AsyncResolver())  # aiodns
+    timeout = aiohttp.ClientTimeout(total=60, connect=30)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout, headers=_PRODUCT_HEADERS)
+
+
+async def scrape_all_products_async(session: aiohttp.ClientSession, url: str, products_file, debug: bool = False):
     """
     Scrape all products using async for massive speed improvement
     """
@@ -19,41 +129,46 @@ async def scrape_all_products_async(url: str, debug: bool = False):
     search_text = extract_search_text(url)
     print(f"Search query: {search_text}\n")
 
+    # Normalise the (possibly already percent-encoded) query once for all pages
+    query = quote(unquote_plus(search_text), safe=':')
+
     print("="*60)
     print("STEP 1: Getting all products")
     print("="*60)
     
     all_products = []
+    seen = set()
     page = 0
     
-    # Still use regular requests for API calls (they're fast)
-    import requests
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-        'Accept': '*/*',
-        'Accept-Language': 'en-US,en;q=0.9',
-    }
+    api_timeout = aiohttp.ClientTimeout(total=10)
     
     while page < 500:
         print(f"Fetching page {page}...", end=" ")
         
-        api_url = build_api_url(search_text, page)
+        api_url = build_api_url(query, page)
         
         try:
-            response = requests.get(api_url, headers=headers, timeout=10)
-            
-            if response.status_code != 200:
-                break
+            async with session.get(api_url, headers=_API_HEADERS, timeout=api_timeout) as response:
+                if response.status != 200:
+                    break
+                
+                data = await response.json(content_type=None)
             
-            data = response.json()
             products = data.get('searchresult', [])
             
             if not products:
                 break
             
+            new_count = 0
             for product in products:
                 mp_code = product.get('productId', '')
                 if mp_code:
+                    # Listings can shift between requests; scrape each product once
+                    if mp_code in seen:
+                        continue
+                    seen.add(mp_code)
+                    new_count += 1
+
                     web_url = product.get('webURL', '')
                     if not web_url.startswith('http'):
                         web_url = f"https://luxury.tatacliq.com{web_url}"
@@ -65,13 +180,13 @@ async def scrape_all_products_async(url: str, debug: bool = False):
                         'brand': product.get('brandname', ''),
                     })
             
-            print(f"✓ Found {len(products)} products (total: {len(all_products)})")
+            print(f"✓ Found {len(products)} products, {new_count} new (total: {len(all_products)})")
             
-            if len(products) < 24:
+            if len(products) < 24 or new_count == 0:
                 break
             
             page += 1
-            time.sleep(0.3)
+            await asyncio.sleep(0.3)
             
         except Exception as e:
             print(f"❌ Error: {e}")
@@ -83,195 +198,274 @@ async def scrape_all_products_async(url: str, debug: bool = False):
     print(f"\n{'='*60}")
     print(f"STEP 2: Scraping product pages (ASYNC)")
     print(f"{'='*60}\n")
-    print(f"⚡ Scraping {len(all_products)} products with 15 concurrent connections...")
+    print(f"⚡ Scraping {len(all_products)} products with {_INITIAL_CONCURRENCY}-{_MAX_CONCURRENCY} concurrent connections (adaptive)...")
     print(f"This will be ~5x faster than regular scraping!\n")
     
-    products_with_text = await scrape_products_batch(all_products, debug)
+    scraped_mp_codes = await scrape_products_batch(session, all_products, products_file, debug)
     
-    return products_with_text
+    return scraped_mp_codes
 
 
-async def scrape_products_batch(products: List[Dict], debug: bool = False):
+async def scrape_products_batch(session: aiohttp.ClientSession, products: List[Dict], products_file,
+                                debug: bool = False) -> List[str]:
     """
     Scrape multiple products concurrently using async
+
+    Each product's record is written to products_file as it completes;
+    only the MP codes of successful scrapes are returned
     """
-    connector = aiohttp.TCPConnector(limit=5, force_close=False, ttl_dns_cache=300)  # 10 concurrent connections
-    timeout = aiohttp.ClientTimeout(total=60, connect=30)
-    
-    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+    controller = ConcurrencyController()
+    scraped_mp_codes = []
+
+    # Schedule in chunks so only _GATHER_CHUNK tasks exist at a time
+    for start in range(0, len(products), _GATHER_CHUNK):
         tasks = []
-        for i, product in enumerate(products, 1):
-            task = scrape_single_product(session, product, i, len(products), debug and i <= 3)
+        for i, product in enumerate(products[start:start + _GATHER_CHUNK], start + 1):
+            task = scrape_single_product(session, controller, product, products_file,
+                                         i, len(products), debug and i <= 3)
             tasks.append(task)
         
-        # Process all products concurrently
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
         # Filter out None results (failed scrapes)
-        products_with_text = [r for r in results if r is not None and not isinstance(r, Exception)]
-        
-        return products_with_text
+        scraped_mp_codes.extend(r for r in results if r is not None and not isinstance(r, Exception))
+    
+    return scraped_mp_codes
 
 
-async def scrape_single_product(session: aiohttp.ClientSession, product: Dict, 
-                                index: int, total: int, show_debug: bool = False):
+async def scrape_single_product(session: aiohttp.ClientSession, controller: ConcurrencyController, product: Dict,
+                                products_file, index: int, total: int, show_debug: bool = False):
     """
-    Scrape a single product page asynchronously
+    Scrape a single product page asynchronously and append it to products_file
     """
     mp_code = product['mp_code']
     product_url = product['url']
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Referer': 'https://luxury.tatacliq.com/'
-    }
-
-    await asyncio.sleep(0.3)  # 300ms delay
 
     # Retry logic - try up to 3 times
+    delay = 0.0
     for attempt in range(3):
         try:
-            await asyncio.sleep(0.2 * attempt)  # Increasing backoff: 0s, 0.2s, 0.4s
+            await asyncio.sleep(delay)
+
+            async with controller.slot():
+                started = time.monotonic()
+                async with session.get(product_url) as response:
+                    controller.record(response.status, time.monotonic() - started)
+                    if response.headers.get('X-RateLimit-Remaining') == '0':
+                        controller.backoff()
+
+                    if response.status != 200:
+                        # Missing or forbidden pages won't change on retry
+                        if response.status not in (403, 404) and attempt < 2:
+                            backoff = 0.2 * 2 ** attempt  # 0.2s, 0.4s
+                            if response.status == 429 or response.status >= 500:
+                                delay = max(_retry_after(response.headers), backoff)
+                            else:
+                                delay = backoff
+                            continue
+                        print(f"❌ {index}/{total}: {mp_code} - Failed (status {response.status})")
+                        return None
+
+                    html = await response.read()
+
+            loop = asyncio.get_running_loop()
+            searchable_text = await loop.run_in_executor(
+                _POOL, _extract_text, html, product['title'], product['brand'])
+
+            # Progress indicator (every 100 products)
+            if index % 100 == 0:
+                print(f"✓ Progress: {index}/{total} products scraped ({index/total*100:.1f}%)")
+
+            if show_debug:
+                print(f"\n{'='*60}")
+                print(f"DEBUG Product {index}")
+                print(f"MP Code: {mp_code}")
+                print(f"URL: {product_url}")
+                print(f"Searchable text length: {len(searchable_text)} chars")
+                print(f"First 500 chars: {searchable_text[:500]}")
+                print(f"{'='*60}\n")
+
+            record = {
+                'mp_code': mp_code,
+                'searchable_text': searchable_text,
+                'title': product['title'],
+                'brand': product['brand']
+            }
+            # Binary mode: each write is one locked buffer append, so lines
+            # from concurrent tasks never interleave
+            await products_file.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+
+            return mp_code
 
-            async with session.get(product_url, headers=headers) as response:
-                if response.status != 200:
-                    if attempt < 2:  # Try again
-                        continue
-                    print(f"❌ {index}/{total}: {mp_code} - Failed (status {response.status})")
-                    return None
-
-                html = await response.text()
-
-                # Parse HTML
-                soup = BeautifulSoup(html, 'html.parser')
+        except asyncio.TimeoutError:
+            controller.backoff()
+            if attempt < 2:
+                delay = 1.0  # Wait 1 second before retry
+                continue
+            print(f"❌ {index}/{total}: {mp_code} - Timeout after 3 attempts")
+            return None
+        except Exception as e:
+            if attempt < 2:
+                delay = 1.0
+                continue
+            print(f"❌ {index}/{total}: {mp_code} - Error: {str(e)[:50]}")
+            return None
 
-                searchable_parts = []
+    return None  # All retries failed
 
-                # Extract content
-                searchable_parts.append(product['title'])
-                searchable_parts.append(product['brand'])
 
-                # Meta tags
-                meta_desc = soup.find('meta', {'name': 'description'})
-                if meta_desc and meta_desc.get('content'):
-                    searchable_parts.append(meta_desc['content'])
+def _retry_after(headers) -> float:
+    """Seconds asked for by a Retry-After header (delta or HTTP date), else 0"""
+    value = headers.get('Retry-After')
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0.0
 
-                meta_keywords = soup.find('meta', {'name': 'keywords'})
-                if meta_keywords and meta_keywords.get('content'):
-                    searchable_parts.append(meta_keywords['content'])
 
-                # Product sections only (exclude recommendations)
-                product_sections = soup.find_all(['h1', 'h2', 'h3', 'p', 'div'],
-                                                 class_=re.compile(r'product|description|detail|feature|special', re.IGNORECASE))
+def _extract_text(html: bytes, title: str, brand: str) -> str:
+    """
+    Lowercased searchable text for one product page (runs in a _POOL worker)
+    """
+    searchable_parts = [title, brand]
+    searchable_parts.extend(_parse_extract_parts(html))
+    return ' '.join(filter(None, searchable_parts)).lower()
+
+
+def _parse_extract_parts(html: bytes) -> List[str]:
+    """Meta description/keywords and product-section text from a product page"""
+    tree = LexborHTMLParser(html)
+    meta = {}
+    sections = []
+
+    for node in tree.css(_PARSE_SELECTOR):
+        if node.tag == 'meta':
+            name = (node.attributes.get('name') or '').lower()
+            content = node.attributes.get('content')
+            if name in ('description', 'keywords') and content:
+                meta.setdefault(name, content)
+            continue
 
-                for section in product_sections:
-                    section_str = str(section.get('class', [])) + str(section.get('id', ''))
-                    if any(word in section_str.lower() for word in ['similar', 'viewed', 'recommend', 'related', 'carousel']):
-                        continue
+        # Product sections only (exclude recommendations)
+        section_str = (node.attributes.get('class') or '') + (node.attributes.get('id') or '')
+        if _EXCLUDE_RE.search(section_str):
+            continue
 
-                    text = section.get_text(separator=' ', strip=True)
-                    searchable_parts.append(text)
+        sections.append(node.text(separator=' ', strip=True))
 
-                searchable_text = ' '.join(str(p) for p in searchable_parts if p).lower()
+    return [meta[name] for name in ('description', 'keywords') if name in meta] + sections
 
-                # Progress indicator (every 100 products)
-                if index % 100 == 0:
-                    print(f"✓ Progress: {index}/{total} products scraped ({index/total*100:.1f}%)")
 
-                if show_debug:
-                    print(f"\n{'='*60}")
-                    print(f"DEBUG Product {index}")
-                    print(f"MP Code: {mp_code}")
-                    print(f"URL: {product_url}")
-                    print(f"Searchable text length: {len(searchable_text)} chars")
-                    print(f"First 500 chars: {searchable_text[:500]}")
-                    print(f"{'='*60}\n")
+def iter_products(filename: str = PRODUCTS_FILE):
+    """Stream scraped product records back from a JSON lines file"""
+    with open(filename, encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
 
-                return {
-                    'mp_code': mp_code,
-                    'searchable_text': searchable_text,
-                    'title': product['title'],
-                    'brand': product['brand']
-                }
 
-        except asyncio.TimeoutError:
-            if attempt < 2:
-                await asyncio.sleep(1)  # Wait 1 second before retry
-                continue
-            print(f"❌ {index}/{total}: {mp_code} - Timeout after 3 attempts")
-            return None
-        except Exception as e:
-            if attempt < 2:
-                await asyncio.sleep(1)
-                continue
-            print(f"❌ {index}/{total}: {mp_code} - Error: {str(e)[:50]}")
-            return None
+def build_keyword_automaton(keywords) -> ahocorasick.Automaton:
+    """Build an Aho-Corasick automaton that reports each matched keyword"""
+    # Texts are lowercased once when scraped and stay str: the standard
+    # pyahocorasick build only accepts str keys and haystacks, not bytes
+    automaton = ahocorasick.Automaton()
+    for keyword in keywords:
+        automaton.add_word(keyword, keyword)
+    automaton.make_automaton()
+    return automaton
 
-    return None  # All retries failed
 
-def filter_by_keywords(products_data: List[Dict], keywords: List[str]) -> List[str]:
+def filter_by_keywords(products_data: Iterable[Dict], keywords: List[str]) -> List[str]:
     """
     Filter products by keywords
     """
     keywords_lower = [kw.lower() for kw in keywords]
     matched_mp_codes = []
+
+    if not keywords_lower:
+        return matched_mp_codes
+
+    automaton = build_keyword_automaton(keywords_lower)
     
     for product in products_data:
-        matches = []
-        for keyword in keywords_lower:
-            if keyword in product['searchable_text']:
-                matches.append(keyword)
-        
-        if matches:
+        # One pass over the text; the first hit is enough
+        if next(automaton.iter(product['searchable_text']), None) is not None:
             matched_mp_codes.append(product['mp_code'])
     
     return matched_mp_codes
 
 
+def filter_by_curations(products_data: Iterable[Dict], curations: List[Dict]) -> Dict[str, List[str]]:
+    """
+    Filter products for all curations at once
+
+    Each product's text is scanned once against the union of every
+    curation's keywords, and hits are bucketed back into curations.
+    """
+    curations_by_keyword = {}
+    for curation in curations:
+        for keyword in curation['keywords']:
+            curations_by_keyword.setdefault(keyword.lower(), set()).add(curation['name'])
+
+    results = {curation['name']: [] for curation in curations}
+
+    if not curations_by_keyword:
+        return results
+
+    automaton = build_keyword_automaton(curations_by_keyword)
+
+    for product in products_data:
+        matched = set()
+        for _, keyword in automaton.iter(product['searchable_text']):
+            matched |= curations_by_keyword[keyword]
+
+        for name in matched:
+            results[name].append(product['mp_code'])
+
+    return results
+
+
 def extract_search_text(url: str) -> str:
     """Extract searchText parameter from URL"""
-    match = re.search(r'[?&](?:q|searchText)=([^&]+)', url)
+    match = _SEARCHTEXT_RE.search(url)
     if match:
         return match.group(1)
     return ':relevance:category:LSH1110101:inStockFlag:true'
 
 
-def build_api_url(search_text: str, page: int) -> str:
-    """Build the Tata CLiQ search API URL"""
-    base_url = "https://searchbff.tatacliq.com/products/lux/search"
-    params = {
-        'pageSize': 24,
-        'page': page,
-        'searchText': search_text,
-        'isPwa': 'true',
-        'channel': 'web',
-        'isMDE': 'true'
-    }
-    param_str = '&'.join([f"{k}={v}" for k, v in params.items()])
-    return f"{base_url}?{param_str}"
+def build_api_url(query: str, page: int) -> str:
+    """Build the Tata CLiQ search API URL from an already URL-encoded query"""
+    return _API_TEMPLATE.format(page=page, q=query)
 
 
 def save_multiple_curations(results: Dict[str, List[str]], filename: str = "all_curations.txt"):
     """
     Save multiple curations to one file
     """
+    lines = [
+        "CURATION RESULTS",
+        f"Generated: {time.strftime('%Y-%m-%d %H:%M:%S')}",
+        '='*60,
+        "",
+    ]
+    
+    for curation_name, mp_codes in results.items():
+        lines.append("")
+        lines.append('='*60)
+        lines.append(f"CURATION: {curation_name}")
+        lines.append(f"Total Products: {len(mp_codes)}")
+        lines.append('='*60)
+        lines.append("")
+        lines.extend(mp_codes)
+        lines.append("")
+    
     with open(filename, 'w', encoding='utf-8') as f:
-        f.write(f"CURATION RESULTS\n")
-        f.write(f"Generated: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"{'='*60}\n\n")
-        
-        for curation_name, mp_codes in results.items():
-            f.write(f"\n{'='*60}\n")
-            f.write(f"CURATION: {curation_name}\n")
-            f.write(f"Total Products: {len(mp_codes)}\n")
-            f.write(f"{'='*60}\n\n")
-            
-            for mp_code in mp_codes:
-                f.write(f"{mp_code}\n")
-            
-            f.write(f"\n")
+        f.write('\n'.join(lines) + '\n')
     
     print(f"\n✓ Saved all curations to {filename}")
 
@@ -341,27 +535,31 @@ async def main():
 
     # Scrape all products ONCE with async
     start_time = time.time()
-    all_products_data = await scrape_all_products_async(url, debug)
+    async with create_session() as session, aiofiles.open(PRODUCTS_FILE, 'wb') as products_file:
+        scraped_mp_codes = await scrape_all_products_async(session, url, products_file, debug)
     scrape_time = time.time() - start_time
 
-    if not all_products_data:
+    if not scraped_mp_codes:
         print("\n❌ No products scraped!")
         return
 
-    print(f"\n✓ Scraped {len(all_products_data)} products in {scrape_time/60:.1f} minutes")
-    print(f"  ({scrape_time/len(all_products_data):.2f} seconds per product)")
+    print(f"\n✓ Scraped {len(scraped_mp_codes)} products in {scrape_time/60:.1f} minutes")
+    print(f"  ({scrape_time/len(scraped_mp_codes):.2f} seconds per product)")
 
     # Filter for each curation
     print(f"\n{'='*60}")
     print(f"FILTERING BY KEYWORDS")
     print(f"{'='*60}\n")
     
-    results = {}
-    for curation in curations:
-        print(f"Filtering: {curation['name']}...", end=" ")
-        matched = filter_by_keywords(all_products_data, curation['keywords'])
-        results[curation['name']] = matched
-        print(f"✓ {len(matched)} matches")
+    results = filter_by_curations(iter_products(PRODUCTS_FILE), curations)
+
+    # Records were written in completion order; report in catalogue order
+    position = {mp_code: i for i, mp_code in enumerate(scraped_mp_codes)}
+    for matched in results.values():
+        matched.sort(key=position.__getitem__)
+
+    for name, matched in results.items():
+        print(f"Filtering: {name}... ✓ {len(matched)} matches")
 
     # Save all results
     save_multiple_curations(results, "all_curations.txt")
@@ -380,4 +578,7 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
@@ -1,8 +1,100 @@
+import asyncio
+import codecs
+import gzip
+import logging
+import os
+import aiohttp
+import ahocorasick
 import requests
 import time
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import unquote_plus, urlencode
 from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 import re
+from email.utils import parsedate_to_datetime
+from html import unescape
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from aiolimiter import AsyncLimiter
+from tqdm import tqdm
+from tqdm.contrib.logging import logging_redirect_tqdm
+
+
+logger = logging.getLogger("curation")
+LOG_FORMAT = '%(asctime)s %(message)s'
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Referer': 'https://luxury.tatacliq.com/'
+}
+
+# Listing batches in a row that may load no page at all (each page after
+# its own retries) before pagination gives up
+MAX_CONSECUTIVE_FAILURES = 3
+
+# Async fetches (search API and product pages): retries per request,
+# statuses worth retrying, and the most API pages requested at once
+FETCH_RETRIES = 5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_PAGE_BATCH = 16
+
+# One keep-alive connection pool for product pages fetched one at a time
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=64,
+    max_retries=Retry(total=5, backoff_factor=0.5,
+                      status_forcelist=RETRY_STATUSES,
+                      allowed_methods=["GET"],
+                      respect_retry_after_header=True,
+                      raise_on_status=False),
+))
+
+# Product-detail sections for parse_product: heading/text/div tags whose
+# class mentions one of these words (case-insensitive)
+SECTION_SELECTOR = (
+    ':is(h1, h2, h3, p, div)'
+    ':is([class*="product" i], [class*="description" i], [class*="detail" i], '
+    '[class*="feature" i], [class*="special" i])'
+)
+
+# Sections whose class/id mention one of these hold other products' text
+SKIP_WORDS = ('similar', 'viewed', 'recommend', 'related', 'carousel')
+
+# Content of <meta name="description" ...> in a raw product page
+META_RE = re.compile(rb'<meta[^>]+name=["\']description["\'][^>]*content=(["\'])(.*?)\1', re.I | re.S)
+
+# Keywords that appear verbatim in raw HTML whenever they appear in its text
+SAFE_RAW_KEYWORD_RE = re.compile(r'[a-z0-9-]+')
+
+# Search query in a luxury.tatacliq.com listing URL
+SEARCH_TEXT_RE = re.compile(r'[?&](?:q|searchText)=([^&]+)')
+
+# Search API endpoint and the query parameters that never change
+API_URL = "https://searchbff.tatacliq.com/products/lux/search"
+BASE_PARAMS = {'isPwa': 'true', 'channel': 'web', 'isMDE': 'true'}
+
+# Raw product pages from earlier runs, one gzipped file per MP code
+CACHE_DIR = Path("html_cache")
+# Product pages are served as utf-8; fresh and cached pages are decoded with
+# it alike, so the raw scan, the meta check and the parse never disagree
+PAGE_ENCODING = 'utf-8'
+
+# Product pages: requests in flight at once, and requests started per second
+MAX_CONCURRENCY = 32
+REQUESTS_PER_SECOND = 10
+
+# Worker processes that parse product pages while the fetches continue, and
+# how many pages may be loaded or parsing at once (keeps the pool fed without
+# holding every cached body in memory)
+PARSE_POOL = ProcessPoolExecutor(max_workers=os.cpu_count())
+PARSE_QUEUE = 2 * (os.cpu_count() or 1)
 
 
 def scrape_and_filter_by_keywords(url: str, keywords: List[str], debug: bool = False):
@@ -18,13 +110,15 @@ def scrape_and_filter_by_keywords(url: str, keywords: List[str], debug: bool = F
 
     # Convert keywords to lowercase for case-insensitive matching
     keywords_lower = [kw.lower() for kw in keywords]
-
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Referer': 'https://luxury.tatacliq.com/'
-    }
+    automaton = build_keyword_automaton(keywords_lower) if keywords_lower else None
+    # Characters kept between streamed chunks so keywords spanning a boundary still hit
+    overlap = max((len(kw) for kw in keywords_lower), default=1) - 1
+    # A keyword missing from the raw HTML is only proof it is missing from the
+    # page text when it can't be entity-encoded (React writes ' as &#x27;)
+    # or split across tags, i.e. when it is only letters, digits and hyphens
+    raw_scan_safe = automaton is not None and all(
+        SAFE_RAW_KEYWORD_RE.fullmatch(kw) for kw in keywords_lower
+    )
 
     # Step 1: Extract search query from URL
     search_text = extract_search_text(url)
@@ -35,56 +129,7 @@ def scrape_and_filter_by_keywords(url: str, keywords: List[str], debug: bool = F
     print("STEP 1: Getting all products")
     print("="*60)
     
-    all_products = []
-    page = 0
-    
-    while page < 100:  # Safety limit
-        print(f"Fetching page {page}...", end=" ")
-        
-        api_url = build_api_url(search_text, page)
-        
-        try:
-            response = requests.get(api_url, headers=headers, timeout=10)
-            
-            if response.status_code != 200:
-                print(f"❌ Failed (status {response.status_code})")
-                break
-            
-            data = response.json()
-            products = data.get('searchresult', [])
-            
-            if not products:
-                print("✓ No more products")
-                break
-            
-            # Extract MP codes and product URLs
-            for product in products:
-                mp_code = product.get('productId', '')
-                if mp_code:
-                    # Build product URL
-                    web_url = product.get('webURL', '')
-                    if not web_url.startswith('http'):
-                        web_url = f"https://luxury.tatacliq.com{web_url}"
-                    
-                    all_products.append({
-                        'mp_code': mp_code,
-                        'url': web_url,
-                        'title': product.get('productname', ''),
-                        'brand': product.get('brandname', ''),
-                    })
-            
-            print(f"✓ Found {len(products)} products (total: {len(all_products)})")
-            
-            if len(products) < 24:
-                print("  → Last page reached")
-                break
-            
-            page += 1
-            time.sleep(0.5)
-            
-        except Exception as e:
-            print(f"❌ Error: {e}")
-            break
+    all_products = asyncio.run(fetch_listing(search_text, max_pages=100))
     
     print(f"\n✓ Total products found: {len(all_products)}")
     
@@ -95,106 +140,123 @@ def scrape_and_filter_by_keywords(url: str, keywords: List[str], debug: bool = F
     
     filtered_mp_codes = []
     
-    for i, product in enumerate(all_products, 1):
-        mp_code = product['mp_code']
-        product_url = product['url']
-        
-        print(f"Checking {i}/{len(all_products)}: {mp_code}...", end=" ")
-        
-        try:
-            # Fetch the product HTML page
-            response = requests.get(product_url, headers=headers, timeout=15)
-            
-            if response.status_code != 200:
-                print(f"❌ Failed to load (status {response.status_code})")
+    total = len(all_products)
+    
+    with logging_redirect_tqdm():
+        for i, product in enumerate(tqdm(all_products, desc="Checking", unit="product"), 1):
+            mp_code = product['mp_code']
+            product_url = product['url']
+            
+            try:
+                # Fetch the product HTML page, scanning the raw markup as it streams in
+                html = load_cached_html(mp_code)
+                from_cache = html is not None
+                if from_cache:
+                    raw_found = set()
+                    if raw_scan_safe:
+                        page_text = html.decode(PAGE_ENCODING, errors='replace').lower()
+                        raw_found = {keyword for _, keyword in automaton.iter(page_text)}
+                else:
+                    with SESSION.get(product_url, stream=True, timeout=15) as response:
+                        if response.status_code != 200:
+                            logger.info("product %d/%d %s ❌ Failed to load (status %d)",
+                                        i, total, mp_code, response.status_code)
+                            continue
+                        # raw_found is only used when raw_scan_safe, so skip the scan otherwise
+                        html, raw_found = read_and_scan(
+                            response, automaton if raw_scan_safe else None, overlap)
+                    save_cached_html(mp_code, html)
+                
+                # Cheap strings first: a keyword in the title, brand or meta
+                # description is a match without parsing the page
+                if automaton and not (debug and i <= 3):
+                    fast_text = f"{product['title']} {product['brand']}"
+                    meta = META_RE.search(html)
+                    if meta:
+                        fast_text += ' ' + unescape(meta.group(2).decode(PAGE_ENCODING, errors='replace'))
+                    fast_found = {keyword for _, keyword in automaton.iter(fast_text.lower())}
+                    if fast_found:
+                        matches = [keyword for keyword in keywords_lower if keyword in fast_found]
+                        filtered_mp_codes.append(mp_code)
+                        logger.info("product %d/%d %s ✓ MATCHED (%s)", i, total, mp_code, ', '.join(matches))
+                        if not from_cache:
+                            time.sleep(0.5)
+                        continue
+                
+                # No keyword in the listing or anywhere in the page: nothing the
+                # parse below could find either, so skip bs4 for this product
+                if raw_scan_safe and not (debug and i <= 3):
+                    if not raw_found:
+                        logger.info("product %d/%d %s ⊘ No match", i, total, mp_code)
+                        if not from_cache:
+                            time.sleep(0.5)
+                        continue
+                
+                # Parse HTML (bytes, with the encoding we already know, so bs4
+                # doesn't sniff the whole body for one)
+                soup = BeautifulSoup(html, 'lxml', from_encoding=PAGE_ENCODING)
+                
+                # Extract all text content
+                searchable_parts = []
+                
+                # 1. Title and brand (from listing)
+                searchable_parts.append(product['title'])
+                searchable_parts.append(product['brand'])
+                
+                # 2. Meta description (often contains the "WHY IT'S SPECIAL" text)
+                meta_desc = soup.find('meta', {'name': 'description'})
+                if meta_desc and meta_desc.get('content'):
+                    searchable_parts.append(meta_desc['content'])
+                
+                # 3. Meta keywords
+                meta_keywords = soup.find('meta', {'name': 'keywords'})
+                if meta_keywords and meta_keywords.get('content'):
+                    searchable_parts.append(meta_keywords['content'])
+                
+                # 4. Get ALL text from the HTML including hidden sections
+                # Don't just get visible text - parse everything. Feature names
+                # and values (sleeve, fabric, fit, ...) are already in here.
+                all_text = soup.get_text(separator=' ', strip=True)
+                searchable_parts.append(all_text)
+                
+                # Combine all text
+                searchable_text = ' '.join(str(p) for p in searchable_parts if p).lower()
+                
+                # Debug output
+                if debug and i <= 3:
+                    logger.info("\n".join([
+                        f"\n{'='*60}",
+                        f"DEBUG Product {i}",
+                        f"MP Code: {mp_code}",
+                        f"URL: {product_url}",
+                        f"Title: {product['title']}",
+                        f"Meta description: {meta_desc['content'][:200] if meta_desc else 'None'}...",
+                        f"Total searchable text length: {len(searchable_text)} chars",
+                        f"\nSearching for these keywords: {keywords_lower}",
+                        f"\nFirst 800 chars of searchable text:",
+                        searchable_text[:800],
+                        f"\n...Last 400 chars:",
+                        searchable_text[-400:],
+                        f"{'='*60}\n",
+                    ]))
+                
+                # Check for keyword matches (one pass over the text for all keywords)
+                found = {keyword for _, keyword in automaton.iter(searchable_text)} if automaton else set()
+                matches = [keyword for keyword in keywords_lower if keyword in found]
+                
+                if matches:
+                    filtered_mp_codes.append(mp_code)
+                    logger.info("product %d/%d %s ✓ MATCHED (%s)", i, total, mp_code, ', '.join(matches))
+                else:
+                    logger.info("product %d/%d %s ⊘ No match", i, total, mp_code)
+                
+                # Rate limiting - be respectful
+                if not from_cache:
+                    time.sleep(0.5)
+                
+            except Exception as e:
+                logger.info("product %d/%d %s ❌ Error: %s", i, total, mp_code, str(e)[:40])
                 continue
-            
-            # Parse HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract all text content
-            searchable_parts = []
-            
-            # 1. Title and brand (from listing)
-            searchable_parts.append(product['title'])
-            searchable_parts.append(product['brand'])
-            
-            # 2. Meta description (often contains the "WHY IT'S SPECIAL" text)
-            meta_desc = soup.find('meta', {'name': 'description'})
-            if meta_desc and meta_desc.get('content'):
-                searchable_parts.append(meta_desc['content'])
-            
-            # 3. Meta keywords
-            meta_keywords = soup.find('meta', {'name': 'keywords'})
-            if meta_keywords and meta_keywords.get('content'):
-                searchable_parts.append(meta_keywords['content'])
-            
-            # 4. Get ALL text from the HTML including hidden sections
-            # Don't just get visible text - parse everything
-            
-            # Method 1: Get all text including hidden elements
-            all_text = soup.get_text(separator=' ', strip=True)
-            searchable_parts.append(all_text)
-            
-            # Method 2: Look for specific feature sections
-            # Features might be in divs, tables, or lists even if hidden
-            # Look for common feature keywords and grab their parent elements
-            feature_keywords = ['sleeve', 'pattern', 'fit', 'neck', 'collar', 'fabric', 
-                              'color', 'colour', 'wash', 'length', 'occasion', 'style',
-                              'material', 'composition', 'care', 'model']
-            
-            for keyword in feature_keywords:
-                # Find all elements containing these words
-                elements = soup.find_all(string=re.compile(keyword, re.IGNORECASE))
-                for elem in elements:
-                    if elem.parent:
-                        # Get the parent and next siblings (feature name + value)
-                        parent_text = elem.parent.get_text(separator=' ', strip=True)
-                        searchable_parts.append(parent_text)
-                        
-                        # Also check next sibling for the value
-                        if elem.parent.next_sibling:
-                            sibling_text = elem.parent.next_sibling.get_text(separator=' ', strip=True) if hasattr(elem.parent.next_sibling, 'get_text') else str(elem.parent.next_sibling)
-                            searchable_parts.append(sibling_text)
-            
-            # Combine all text
-            searchable_text = ' '.join(str(p) for p in searchable_parts if p).lower()
-            
-            # Debug output
-            if debug and i <= 3:
-                print(f"\n{'='*60}")
-                print(f"DEBUG Product {i}")
-                print(f"MP Code: {mp_code}")
-                print(f"URL: {product_url}")
-                print(f"Title: {product['title']}")
-                print(f"Meta description: {meta_desc['content'][:200] if meta_desc else 'None'}...")
-                print(f"Total searchable text length: {len(searchable_text)} chars")
-                print(f"\nSearching for these keywords: {keywords_lower}")
-                print(f"\nFirst 800 chars of searchable text:")
-                print(searchable_text[:800])
-                print(f"\n...Last 400 chars:")
-                print(searchable_text[-400:])
-                print(f"{'='*60}\n")
-                print(f"Checking {i}/{len(all_products)}: {mp_code}...", end=" ")
-            
-            # Check for keyword matches
-            matches = []
-            for keyword in keywords_lower:
-                if keyword in searchable_text:
-                    matches.append(keyword)
-            
-            if matches:
-                filtered_mp_codes.append(mp_code)
-                print(f"✓ MATCHED ({', '.join(matches)})")
-            else:
-                print("⊘ No match")
-            
-            # Rate limiting - be respectful
-            time.sleep(0.5)
-            
-        except Exception as e:
-            print(f"❌ Error: {str(e)[:40]}")
-            continue
     
     print(f"\n{'='*60}")
     print(f"FILTERING COMPLETE")
@@ -207,27 +269,70 @@ def scrape_and_filter_by_keywords(url: str, keywords: List[str], debug: bool = F
     return filtered_mp_codes
 
 
+def cached_html_path(mp_code: str) -> Path:
+    """Where the page for mp_code is (or would be) cached"""
+    return CACHE_DIR / f"{mp_code}.html.gz"
+
+
+def load_cached_html(mp_code: str) -> Optional[bytes]:
+    """Return the cached page body for mp_code, or None if it was never saved"""
+    path = cached_html_path(mp_code)
+    if not path.exists():
+        return None
+    return gzip.decompress(path.read_bytes())
+
+
+def save_cached_html(mp_code: str, html: bytes):
+    """Save a fetched page so later runs can skip the network"""
+    CACHE_DIR.mkdir(exist_ok=True)
+    path = cached_html_path(mp_code)
+    # Write then rename, so an interrupted run never leaves a truncated entry
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_bytes(gzip.compress(html))
+    tmp.replace(path)
+
+
+def read_and_scan(response, automaton, overlap: int):
+    """
+    Read a streamed response body while scanning it for keywords
+    Returns the raw page body and the keywords seen anywhere in its markup
+    (no automaton: the body is only read, not decoded or scanned)
+    """
+    decoder = codecs.getincrementaldecoder(PAGE_ENCODING)(errors='replace')
+    chunks = []
+    found = set()
+    tail = ''
+
+    def scan(text):
+        nonlocal tail
+        if text:
+            window = tail + text.lower()
+            found.update(keyword for _, keyword in automaton.iter(window))
+            tail = window[-overlap:] if overlap else ''
+
+    for chunk in response.iter_content(chunk_size=16384):
+        chunks.append(chunk)
+        if automaton:
+            scan(decoder.decode(chunk))
+    if automaton:
+        scan(decoder.decode(b'', final=True))
+
+    return b''.join(chunks), found
+
+
 def extract_search_text(url: str) -> str:
     """Extract searchText parameter from URL"""
-    match = re.search(r'[?&](?:q|searchText)=([^&]+)', url)
+    match = SEARCH_TEXT_RE.search(url)
     if match:
-        return match.group(1)
+        # Decoded, so build_api_url can encode it exactly once
+        return unquote_plus(match.group(1))
     return ':relevance:category:LSH1110101:inStockFlag:true'
 
 
 def build_api_url(search_text: str, page: int) -> str:
     """Build the Tata CLiQ search API URL"""
-    base_url = "https://searchbff.tatacliq.com/products/lux/search"
-    params = {
-        'pageSize': 24,
-        'page': page,
-        'searchText': search_text,
-        'isPwa': 'true',
-        'channel': 'web',
-        'isMDE': 'true'
-    }
-    param_str = '&'.join([f"{k}={v}" for k, v in params.items()])
-    return f"{base_url}?{param_str}"
+    params = {'pageSize': 24, 'page': page, 'searchText': search_text, **BASE_PARAMS}
+    return f"{API_URL}?{urlencode(params, safe=':')}"
 
 
 def save_mp_codes(mp_codes: List[str], filename: str = "filtered_mp_codes.txt"):
@@ -245,6 +350,8 @@ def main():
     Scrapes once, filters multiple times
     """
     
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    
     print("\n" + "="*60)
     print("CURATION MAKER - Multiple Curations")
     print("="*60)
@@ -319,12 +426,10 @@ def main():
     print(f"FILTERING BY KEYWORDS")
     print(f"{'='*60}\n")
     
-    results = {}
-    for curation in curations:
-        print(f"Filtering: {curation['name']}...", end=" ")
-        matched = filter_by_keywords(all_products_data, curation['keywords'])
-        results[curation['name']] = matched
-        print(f"✓ {len(matched)} matches")
+    # One pass over each product's text for every curation
+    results = filter_by_curations(all_products_data, curations)
+    for name, matched in results.items():
+        print(f"Filtering: {name}... ✓ {len(matched)} matches")
 
     # Save all results
     save_multiple_curations(results, "all_curations.txt")
@@ -344,15 +449,8 @@ def main():
 
 def scrape_all_products(url: str, debug: bool = False):
     """
-    Scrape all products and return their data with searchable text
+    Scrape all products and return their data with searchable text parts
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Referer': 'https://luxury.tatacliq.com/'
-    }
-
     # Step 1: Get all product URLs
     search_text = extract_search_text(url)
     print(f"Search query: {search_text}\n")
@@ -361,51 +459,7 @@ def scrape_all_products(url: str, debug: bool = False):
     print("STEP 1: Getting all products")
     print("="*60)
     
-    all_products = []
-    page = 0
-    
-    while page < 500:
-        print(f"Fetching page {page}...", end=" ")
-        
-        api_url = build_api_url(search_text, page)
-        
-        try:
-            response = requests.get(api_url, headers=headers, timeout=10)
-            
-            if response.status_code != 200:
-                break
-            
-            data = response.json()
-            products = data.get('searchresult', [])
-            
-            if not products:
-                break
-            
-            for product in products:
-                mp_code = product.get('productId', '')
-                if mp_code:
-                    web_url = product.get('webURL', '')
-                    if not web_url.startswith('http'):
-                        web_url = f"https://luxury.tatacliq.com{web_url}"
-                    
-                    all_products.append({
-                        'mp_code': mp_code,
-                        'url': web_url,
-                        'title': product.get('productname', ''),
-                        'brand': product.get('brandname', ''),
-                    })
-            
-            print(f"✓ Found {len(products)} products (total: {len(all_products)})")
-            
-            if len(products) < 24:
-                break
-            
-            page += 1
-            time.sleep(0.5)
-            
-        except Exception as e:
-            print(f"❌ Error: {e}")
-            break
+    all_products = asyncio.run(fetch_listing(search_text, max_pages=500))
     
     print(f"\n✓ Total products found: {len(all_products)}")
     
@@ -414,76 +468,276 @@ def scrape_all_products(url: str, debug: bool = False):
     print(f"STEP 2: Scraping product pages")
     print(f"{'='*60}\n")
     
+    # Only pages missing from the cache go to the network
+    cached = sum(cached_html_path(product['mp_code']).exists() for product in all_products)
+    
+    print(f"Fetching {len(all_products) - cached} product pages ({cached} cached, "
+          f"{MAX_CONCURRENCY} concurrent), parsing in {os.cpu_count()} processes...\n")
+    parsed = asyncio.run(fetch_all(all_products))
+    
     products_with_text = []
     
-    for i, product in enumerate(all_products, 1):
-        mp_code = product['mp_code']
-        product_url = product['url']
+    # Progress was logged as each page finished; keep the loaded ones in catalogue order
+    for i, (product, searchable_parts) in enumerate(zip(all_products, parsed), 1):
+        if searchable_parts is None or isinstance(searchable_parts, Exception):
+            continue
         
-        print(f"Scraping {i}/{len(all_products)}: {mp_code}...", end=" ")
+        products_with_text.append({
+            'mp_code': product['mp_code'],
+            'searchable_parts': searchable_parts,
+            'title': product['title'],
+            'brand': product['brand']
+        })
         
+        # Show debug for first 3
+        if debug and i <= 3:
+            logger.info("\n".join([
+                f"\n{'='*60}",
+                f"DEBUG Product {i}",
+                f"MP Code: {product['mp_code']}",
+                f"Searchable text length: {sum(len(part) for part in searchable_parts)} chars",
+                f"First 500 chars: {' '.join(searchable_parts)[:500]}",
+                f"{'='*60}\n",
+            ]))
+    
+    return products_with_text
+
+
+async def fetch_listing_page(session: aiohttp.ClientSession, search_text: str, page: int,
+                             limiter: AsyncLimiter) -> Optional[list]:
+    """
+    Fetch one search API page, retrying 429/5xx and network errors with
+    backoff (honouring Retry-After); its products, or None if it never loaded
+    """
+    url = build_api_url(search_text, page)
+    for attempt in range(FETCH_RETRIES + 1):
+        delay = 0.5 * 2 ** attempt
         try:
-            response = requests.get(product_url, headers=headers, timeout=15)
-            
-            if response.status_code != 200:
-                print(f"❌ Failed")
-                continue
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            searchable_parts = []
-            
-            # Extract content
-            searchable_parts.append(product['title'])
-            searchable_parts.append(product['brand'])
-            
-            meta_desc = soup.find('meta', {'name': 'description'})
-            if meta_desc and meta_desc.get('content'):
-                searchable_parts.append(meta_desc['content'])
-            
-            meta_keywords = soup.find('meta', {'name': 'keywords'})
-            if meta_keywords and meta_keywords.get('content'):
-                searchable_parts.append(meta_keywords['content'])
-            
-            # Targeted sections only
-            product_sections = soup.find_all(['h1', 'h2', 'h3', 'p', 'div'], 
-                                             class_=re.compile(r'product|description|detail|feature|special', re.IGNORECASE))
-            
-            for section in product_sections:
-                section_str = str(section.get('class', [])) + str(section.get('id', ''))
-                if any(word in section_str.lower() for word in ['similar', 'viewed', 'recommend', 'related', 'carousel']):
-                    continue
+            async with limiter:
+                async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as r:
+                    if r.status == 200:
+                        data = await r.json(content_type=None)
+                        return data.get('searchresult', [])
+                    if r.status not in RETRY_STATUSES:
+                        return None
+                    delay = max(delay, retry_after(r.headers))
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            pass
+        if attempt < FETCH_RETRIES:
+            await asyncio.sleep(delay)
+    return None
+
+
+async def fetch_listing(search_text: str, max_pages: int) -> List[dict]:
+    """
+    Get every product in the listing, fetching API pages a batch at a time.
+    The batch doubles while every page loads and halves when one fails;
+    the first short page is the last one.
+    """
+    all_products = []
+    seen_mp = set()  # the API can repeat a product on adjacent pages
+    page = 0
+    batch = 1
+    failures = 0
+    limiter = AsyncLimiter(REQUESTS_PER_SECOND, 1)
+    
+    async with aiohttp.ClientSession(headers=HEADERS) as session:
+        while page < max_pages:
+            pages = range(page, min(page + batch, max_pages))
+            results = await asyncio.gather(
+                *(fetch_listing_page(session, search_text, p, limiter) for p in pages))
+            
+            # Take pages in order up to the first failure; that page leads the next batch
+            last_page = False
+            for p, products in zip(pages, results):
+                if products is None:
+                    print(f"Page {p}: ❌ Failed")
+                    break
                 
-                text = section.get_text(separator=' ', strip=True)
-                searchable_parts.append(text)
-            
-            searchable_text = ' '.join(str(p) for p in searchable_parts if p).lower()
-            
-            products_with_text.append({
-                'mp_code': mp_code,
-                'searchable_text': searchable_text,
-                'title': product['title'],
-                'brand': product['brand']
-            })
+                # Extract MP codes and product URLs
+                for product in products:
+                    mp_code = product.get('productId', '')
+                    if mp_code and mp_code not in seen_mp:
+                        seen_mp.add(mp_code)
+                        # Build product URL
+                        web_url = product.get('webURL', '')
+                        if not web_url.startswith('http'):
+                            web_url = f"https://luxury.tatacliq.com{web_url}"
+                        
+                        all_products.append({
+                            'mp_code': mp_code,
+                            'url': web_url,
+                            'title': product.get('productname', ''),
+                            'brand': product.get('brandname', ''),
+                        })
+                
+                print(f"Page {p}: ✓ Found {len(products)} products (total: {len(all_products)})")
+                page = p + 1
+                
+                if len(products) < 24:
+                    print("  → Last page reached")
+                    last_page = True
+                    break
             
-            print(f"✓ ({len(searchable_text)} chars)")
+            if last_page:
+                break
             
-            # Show debug for first 3
-            if debug and i <= 3:
-                print(f"\n{'='*60}")
-                print(f"DEBUG Product {i}")
-                print(f"MP Code: {mp_code}")
-                print(f"Searchable text length: {len(searchable_text)} chars")
-                print(f"First 500 chars: {searchable_text[:500]}")
-                print(f"{'='*60}\n")
+            if page == pages.start:
+                # Not one page of the batch loaded
+                failures += 1
+                if failures >= MAX_CONSECUTIVE_FAILURES:
+                    break
+                batch = max(1, batch // 2)
+                continue
             
-            time.sleep(0.5)
+            failures = 0
+            if page == pages.stop:
+                batch = min(batch * 2, MAX_PAGE_BATCH)
+            else:
+                batch = max(1, batch // 2)
+    
+    return all_products
+
+
+def retry_after(headers) -> float:
+    """Seconds asked for by a Retry-After header (delta or HTTP date), else 0"""
+    value = headers.get('Retry-After')
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0.0
+
+
+async def fetch(session: aiohttp.ClientSession, url: str, sem: asyncio.Semaphore,
+                limiter: AsyncLimiter) -> Optional[bytes]:
+    """
+    Fetch one product page, retrying 429/5xx and network errors with
+    backoff (honouring Retry-After); None if it did not load
+    """
+    for attempt in range(FETCH_RETRIES + 1):
+        delay = 0.5 * 2 ** attempt
+        try:
+            async with sem, limiter:
+                async with session.get(url, timeout=aiohttp.ClientTimeout(total=15)) as r:
+                    if r.status == 200:
+                        # Raw bytes: the parser and the cache both take them as-is,
+                        # so there is no charset detection or decode per page
+                        return await r.read()
+                    if r.status not in RETRY_STATUSES:
+                        return None
+                    delay = max(delay, retry_after(r.headers))
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt == FETCH_RETRIES:
+                raise
+        if attempt < FETCH_RETRIES:
+            # Wait outside the semaphore so other pages keep its slot
+            await asyncio.sleep(delay)
+    return None
+
+
+async def fetch_and_parse(session: aiohttp.ClientSession, product: dict, sem: asyncio.Semaphore,
+                          limiter: AsyncLimiter, parse_sem: asyncio.Semaphore) -> Optional[List[str]]:
+    """
+    Load one product page from the cache (or fetch and cache it) and parse
+    it in PARSE_POOL; its searchable parts, or None if it did not load
+    """
+    mp_code = product['mp_code']
+    loop = asyncio.get_running_loop()
+    
+    # Parsing is CPU-bound: hand it to a worker process so this event loop
+    # keeps fetching other pages meanwhile. parse_sem bounds the pages being
+    # read and parsed, so bodies are held only until they are parsed.
+    async with parse_sem:
+        html = await loop.run_in_executor(None, load_cached_html, mp_code)
+        if html is not None:
+            return await loop.run_in_executor(PARSE_POOL, parse_product, html,
+                                              product['title'], product['brand'])
+    
+    html = await fetch(session, product['url'], sem, limiter)
+    if html is None:
+        return None
+    
+    async with parse_sem:
+        await loop.run_in_executor(None, save_cached_html, mp_code, html)
+        return await loop.run_in_executor(PARSE_POOL, parse_product, html,
+                                          product['title'], product['brand'])
+
+
+async def fetch_all(products: List[dict]) -> list:
+    """
+    Fetch product pages concurrently (MAX_CONCURRENCY in flight,
+    REQUESTS_PER_SECOND started) and parse them, cached pages included;
+    failures come back as exceptions. Each product is logged, and ticks
+    the progress bar, as soon as it finishes.
+    """
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    limiter = AsyncLimiter(REQUESTS_PER_SECOND, 1)
+    parse_sem = asyncio.Semaphore(PARSE_QUEUE)
+    connector = aiohttp.TCPConnector(limit_per_host=MAX_CONCURRENCY, ttl_dns_cache=300)
+    total = len(products)
+    
+    async with aiohttp.ClientSession(connector=connector, headers=HEADERS) as session:
+        with logging_redirect_tqdm(), tqdm(total=total, desc="Scraping", unit="product") as progress:
+            
+            async def scrape(i: int, product: dict):
+                mp_code = product['mp_code']
+                try:
+                    searchable_parts = await fetch_and_parse(session, product, sem, limiter, parse_sem)
+                except Exception as e:
+                    logger.info("product %d/%d %s ❌ Error: %s", i, total, mp_code,
+                                str(e)[:30] or type(e).__name__)
+                    return e
+                finally:
+                    progress.update()
+                
+                if searchable_parts is None:
+                    logger.info("product %d/%d %s ❌ Failed", i, total, mp_code)
+                else:
+                    logger.info("product %d/%d %s ✓ (%d chars)", i, total, mp_code,
+                                sum(len(part) for part in searchable_parts))
+                return searchable_parts
             
-        except Exception as e:
-            print(f"❌ Error: {str(e)[:30]}")
+            tasks = [scrape(i, product) for i, product in enumerate(products, 1)]
+            return await asyncio.gather(*tasks)
+
+
+def parse_product(html: bytes, title: str, brand: str) -> List[str]:
+    """
+    Extract the lowercased searchable text parts from a product page
+    """
+    tree = LexborHTMLParser(html)
+    
+    searchable_parts = []
+    
+    # Extract content
+    searchable_parts.append(title)
+    searchable_parts.append(brand)
+    
+    meta_desc = tree.css_first('meta[name="description"]')
+    if meta_desc and meta_desc.attributes.get('content'):
+        searchable_parts.append(meta_desc.attributes['content'])
+    
+    meta_keywords = tree.css_first('meta[name="keywords"]')
+    if meta_keywords and meta_keywords.attributes.get('content'):
+        searchable_parts.append(meta_keywords.attributes['content'])
+    
+    # Targeted sections only
+    for section in tree.css(SECTION_SELECTOR):
+        section_str = (section.attributes.get('class') or '') + (section.attributes.get('id') or '')
+        section_str = section_str.lower()
+        if any(word in section_str for word in SKIP_WORDS):
             continue
+        
+        text = section.text(separator=' ', strip=True)
+        searchable_parts.append(text)
     
-    return products_with_text
+    return [str(p).lower() for p in searchable_parts if p]
 
 
 def filter_by_keywords(products_data: List, keywords: List[str]) -> List[str]:
@@ -493,18 +747,60 @@ def filter_by_keywords(products_data: List, keywords: List[str]) -> List[str]:
     keywords_lower = [kw.lower() for kw in keywords]
     matched_mp_codes = []
     
+    if not keywords_lower:
+        return matched_mp_codes
+    
+    automaton = build_keyword_automaton(keywords_lower)
+    
     for product in products_data:
-        matches = []
-        for keyword in keywords_lower:
-            if keyword in product['searchable_text']:
-                matches.append(keyword)
-        
-        if matches:
+        # One pass over the parts; the first hit is enough
+        if any(next(automaton.iter(part), None) is not None
+               for part in product['searchable_parts']):
             matched_mp_codes.append(product['mp_code'])
     
     return matched_mp_codes
 
 
+def filter_by_curations(products_data: List, curations: List[Dict]) -> Dict[str, List[str]]:
+    """
+    Filter products for all curations at once
+    """
+    curations_by_keyword = {}
+    for curation in curations:
+        for keyword in curation['keywords']:
+            curations_by_keyword.setdefault(keyword.lower(), set()).add(curation['name'])
+    
+    results = {curation['name']: [] for curation in curations}
+    
+    if not curations_by_keyword:
+        return results
+    
+    automaton = build_keyword_automaton(curations_by_keyword)
+    
+    for product in products_data:
+        # Every keyword hit in the parts, mapped back to its curations
+        matched = set()
+        for part in product['searchable_parts']:
+            for _, keyword in automaton.iter(part):
+                matched |= curations_by_keyword[keyword]
+        
+        for name in matched:
+            results[name].append(product['mp_code'])
+    
+    return results
+
+
+def build_keyword_automaton(keywords: List[str]) -> ahocorasick.Automaton:
+    """Build an Aho-Corasick automaton that reports each matched keyword"""
+    # str only (the standard pyahocorasick build rejects bytes), which is why
+    # read_and_scan decodes each chunk before scanning it
+    automaton = ahocorasick.Automaton()
+    for keyword in keywords:
+        automaton.add_word(keyword, keyword)
+    automaton.make_automaton()
+    return automaton
+
+
 def save_multiple_curations(results, filename: str = "all_curations.txt"):
     """
     Save multiple curations to one file